@@ -6,8 +6,15 @@ import json
 from io import StringIO
 from dotenv import load_dotenv
 import re
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from zoneinfo import ZoneInfo  # For timezone support
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # Add this after imports but before any other Streamlit commands
 st.set_page_config(
@@ -205,12 +212,15 @@ def log_to_google_sheets(
     total_tokens=None,
     user_summary=None,
     model_comparison=None,
-    model_judgement=None
+    model_judgement=None,
+    refinement_tokens_saved=None,
+    prescore_findings=None
 ):
     """
     Sends log data including initial output, evaluator feedback, evaluator score,
     refined output, and additional evaluation details (user_summary, model_comparison, model_judgement),
-    along with the original fields, to the specified Google Sheet via the provided webhook.
+    along with the original fields, the completion tokens saved by refinement and the
+    local pre-scorer findings, to the specified Google Sheet via the provided webhook.
     """
     timestamp = get_current_timestamp()
     data = {
@@ -227,7 +237,9 @@ def log_to_google_sheets(
         "total_tokens": total_tokens if total_tokens is not None else "",
         "user_summary": user_summary if user_summary is not None else "",
         "model_comparison": model_comparison if model_comparison is not None else "",
-        "model_judgement": model_judgement if model_judgement is not None else ""
+        "model_judgement": model_judgement if model_judgement is not None else "",
+        "refinement_tokens_saved": refinement_tokens_saved if refinement_tokens_saved is not None else "",
+        "prescore_findings": json.dumps(prescore_findings) if prescore_findings is not None else ""
     }
     try:
         response = requests.post(WEBHOOK_URL, json=data)
@@ -235,14 +247,172 @@ def log_to_google_sheets(
     except Exception as e:
         return f"Logging error: {e}"
 
+###############################################################################
+# Session Artifact Store and Memory Reporting
+###############################################################################
+# Bytes of state that outlives a run (all sessions together) kept in memory before spilling to disk.
+ARTIFACT_MEMORY_BUDGET = 32 * 1024 * 1024
+
+class ArtifactMemoryBudget:
+    """
+    Process-wide byte budget shared by every session's artifact store, so the
+    state kept between reruns stays within a fixed amount of memory no matter
+    how many sessions are open.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size):
+        with self._lock:
+            if self.used + size > self.limit:
+                return False
+            self.used += size
+            return True
+
+    def release(self, size):
+        with self._lock:
+            self.used = max(0, self.used - size)
+
+@st.cache_resource
+def get_artifact_memory_budget():
+    return ArtifactMemoryBudget(ARTIFACT_MEMORY_BUDGET)
+
+def _release_held_bytes(budget, held):
+    budget.release(held[0])
+    held[0] = 0
+
+class SessionArtifactStore:
+    """
+    Keeps per-session state that later reruns need (the fan-out candidate
+    evaluation). Drafts and feedback are not stored here; they are locals that
+    are freed when the run ends. Values are held in memory while the
+    process-wide budget allows it and written to a per-session temp directory
+    otherwise. Memory and files are released when the session's store is
+    garbage collected.
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget or get_artifact_memory_budget()
+        self._memory = {}
+        self._spilled = {}
+        # Held in a list so the finalizer can release it without referencing the store.
+        self._held = [0]
+        self._spill_dir = None
+        weakref.finalize(self, _release_held_bytes, self.budget, self._held)
+
+    def put(self, key, value):
+        self.discard(key)
+        value = value or ""
+        size = len(value.encode("utf-8"))
+        if self.budget.reserve(size):
+            self._memory[key] = value
+            self._held[0] += size
+        else:
+            self._spill(key, value)
+
+    def get(self, key, default=None):
+        if key in self._memory:
+            return self._memory[key]
+        if key in self._spilled:
+            with open(self._spilled[key], "r", encoding="utf-8") as file:
+                return file.read()
+        return default
+
+    def discard(self, key):
+        if key in self._memory:
+            size = len(self._memory.pop(key).encode("utf-8"))
+            self._held[0] -= size
+            self.budget.release(size)
+        path = self._spilled.pop(key, None)
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+    def clear(self):
+        for key in list(self._memory) + list(self._spilled):
+            self.discard(key)
+
+    def stats(self):
+        return {
+            "memory_bytes": self._held[0],
+            "memory_items": len(self._memory),
+            "spilled_items": len(self._spilled),
+            "process_artifact_bytes": self.budget.used
+        }
+
+    def _spill(self, key, value):
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="nexatalent_session_")
+            weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+        path = os.path.join(self._spill_dir, f"{re.sub(r'[^A-Za-z0-9_]', '_', key)}.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(value)
+        self._spilled[key] = path
+
+def get_process_memory_mb():
+    """
+    Returns the current resident set size of the server process in MB,
+    or None if it cannot be determined on this platform.
+    """
+    try:
+        with open("/proc/self/statm", "r") as file:
+            resident_pages = int(file.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and kilobytes on Linux.
+        return max_rss / (1024 * 1024) if os.uname().sysname == "Darwin" else max_rss / 1024
+    except (ImportError, AttributeError):
+        return None
+
+def report_session_memory(store, stage):
+    """
+    Logs process memory alongside this session's artifact footprint so server
+    sizing can be derived from per-session numbers.
+    """
+    ctx = get_script_run_ctx()
+    session_id = ctx.session_id if ctx is not None else "unknown"
+    rss_mb = get_process_memory_mb()
+    stats = store.stats()
+    rss_text = f"{rss_mb:.1f}MB" if rss_mb is not None else "n/a"
+    print(
+        f"[memory] session={session_id} stage={stage} process_rss={rss_text} "
+        f"artifacts_in_memory={stats['memory_bytes']}B ({stats['memory_items']} items) "
+        f"artifacts_spilled={stats['spilled_items']} "
+        f"process_artifacts_in_memory={stats['process_artifact_bytes']}B"
+    )  # Log to console
+
 ###############################################################################
 # Evaluator Function
 ###############################################################################
 
-def evaluate_content(generated_output, rubric_context):
+# Asked of every evaluator call so refinement can target only the sections with problems.
+SECTION_VERDICT_INSTRUCTIONS = (
+    "Finish with one line per problem in the form 'Section: <heading> — <issue>', using the heading exactly as it "
+    "appears in the content. Only list sections that need changes; do not list sections that are fine."
+)
+SECTION_VERDICT_PATTERN = re.compile(r"^\s*(?:[-*]\s*)?\**Section\**:\s*(.+?)\s+[—–-]{1,2}\s+(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+
+def parse_section_verdicts(evaluator_feedback):
+    """
+    Returns (heading, issue) pairs for every "Section: <heading> — <issue>" line.
+    """
+    return [
+        (heading.strip().strip("*\"'").strip(), issue)
+        for heading, issue in SECTION_VERDICT_PATTERN.findall(evaluator_feedback or "")
+    ]
+
+def evaluate_content(generated_output, rubric_context, findings):
     """
     Sends the generated output and rubric context to the evaluator model (OpenAI)
-    and returns the evaluation feedback and score.
+    and returns the evaluation feedback and score. Structure has already been
+    checked by the local pre-scorer, so rubric_context should hold only the
+    substantive rubric dimensions and the evaluator is asked about substance only.
     """
     # Comment out Google AI configuration for now
     # GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -253,13 +423,17 @@ def evaluate_content(generated_output, rubric_context):
     #     return None, ""
     # genai.configure(api_key=GOOGLE_API_KEY)
     
+    # The >> summary lines are not graded, so they are left out.
+    generated_output = "\n".join(line for line in generated_output.splitlines() if not line.lstrip().startswith(">>")).strip()
     evaluator_prompt = (
-        "You are an expert evaluator. Using the following rubric, evaluate the generated content below. "
-        "Return a numerical score (0-5) and provide detailed feedback for improvements.\n\n"
+        "You are an expert evaluator. Using the following rubric, evaluate the substance of the generated content below. "
+        "Headings, coverage and length have already been checked automatically, so do not comment on them. "
+        "Return a numerical score (0-5) and provide concise feedback for improvements, naming the section each point applies to.\n\n"
         f"Rubric Context:\n{rubric_context}\n\n"
+        f"Automated Findings:\n{format_findings(findings)}\n\n"
         f"Generated Content:\n{generated_output}\n\n"
         "Important: Start your response with 'Score: X' where X is your numerical score, "
-        "then provide your detailed feedback."
+        "then provide your feedback. " + SECTION_VERDICT_INSTRUCTIONS
     )
     
     try:
@@ -326,6 +500,22 @@ def extract_evaluation_parts(text):
     
     return user_summary, model_comparison, model_judgement
 
+def parse_model_judgement(text):
+    """
+    Returns the 0-5 similarity score from the >>Model Judgement line, or None.
+    The line may hold a bare number or a sentence ending in the score.
+    """
+    _, _, model_judgement = extract_evaluation_parts(text)
+    scores = re.findall(r"\b([0-5])\b", model_judgement)
+    return int(scores[-1]) if scores else None
+
+def is_off_task(text):
+    """
+    Returns True when the >>Model Judgement score marks the notes as off-task (2 or less).
+    """
+    model_judgement_value = parse_model_judgement(text)
+    return model_judgement_value is not None and model_judgement_value <= 2
+
 ###############################################################################
 # Mappings and Helper Texts
 ###############################################################################
@@ -556,6 +746,952 @@ We have found that our tools generate the best content when they know more about
     """
 }
 
+###############################################################################
+# Section Helpers
+###############################################################################
+SECTION_HEADING_PATTERN = re.compile(r"^\s*\*\*(.+?)\*\*\s*$", re.MULTILINE)
+
+def split_sections(text):
+    """
+    Splits markdown output into the text before the first bold heading and an
+    ordered list of (heading, body) pairs, one per "**Heading**" line.
+    """
+    matches = list(SECTION_HEADING_PATTERN.finditer(text))
+    if not matches:
+        return text.strip(), []
+    preamble = text[:matches[0].start()].strip()
+    sections = []
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        sections.append((match.group(1).strip(), text[match.end():end].strip()))
+    return preamble, sections
+
+def join_sections(preamble, sections):
+    """
+    Rebuilds markdown output from a preamble and ordered (heading, body) pairs.
+    """
+    parts = [preamble] if preamble else []
+    parts.extend(f"**{heading}**\n{body}" for heading, body in sections)
+    return "\n\n".join(parts)
+
+def run_completion(system_content, user_content, max_tokens=None, response_format=None):
+    """
+    Runs a single chat completion and returns the stripped text together with
+    the (prompt, completion, total) token counts reported by the API.
+    """
+    kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+    if response_format:
+        kwargs["response_format"] = response_format
+    response = openai.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": user_content}
+        ],
+        temperature=0.7,
+        **kwargs
+    )
+    usage = getattr(response, "usage", None)
+    counts = (usage.prompt_tokens, usage.completion_tokens, usage.total_tokens) if usage is not None else (0, 0, 0)
+    return response.choices[0].message.content.strip(), counts
+
+def sum_usage(usages):
+    return tuple(sum(values) for values in zip(*usages)) if usages else (0, 0, 0)
+
+###############################################################################
+# Parallel Job Description Generation
+###############################################################################
+# Ordered to match the headings required by TASK_FORMAT_DEFINITIONS["Write a job description"].
+# "dimension" is the number of the Job Description rubric dimension each section is written against.
+JOB_DESCRIPTION_SECTIONS = {
+    "About Us": {
+        "max_tokens": 250,
+        "guidance": "One paragraph under 150 words describing the company, its mission and culture.",
+        "dimension": 3
+    },
+    "Job Summary": {
+        "max_tokens": 250,
+        "guidance": "One paragraph summarizing the role, its location and its purpose within the team.",
+        "dimension": 1
+    },
+    "Key Responsibilities": {
+        "max_tokens": 400,
+        "guidance": "Five to eight bullet points, each starting with an action verb.",
+        "dimension": 1
+    },
+    "Requirements": {
+        "max_tokens": 300,
+        "guidance": "Bullet points listing only truly mandatory requirements, including location and citizenship requirements when applicable.",
+        "dimension": 2
+    },
+    "Qualifications": {
+        "max_tokens": 300,
+        "guidance": "Bullet points listing education, certifications and experience.",
+        "dimension": 2
+    },
+    "Key Skills": {
+        "max_tokens": 250,
+        "guidance": "Bullet points naming specific technologies and tools rather than general terms whenever possible.",
+        "dimension": 2
+    },
+    "Benefits": {
+        "max_tokens": 250,
+        "guidance": "Bullet points listing the benefits offered.",
+        "dimension": 4
+    },
+    "Salary": {
+        "max_tokens": 120,
+        "guidance": "The salary range, consistent with local pay transparency laws.",
+        "dimension": 4
+    },
+    "Work Environment": {
+        "max_tokens": 200,
+        "guidance": "A short paragraph describing the physical setting, schedule and team environment.",
+        "dimension": 3
+    }
+}
+
+PARALLEL_SECTION_WORKERS = len(JOB_DESCRIPTION_SECTIONS)
+
+JOB_DESCRIPTION_PLANNING_INSTRUCTIONS = """
+You are a highly skilled assistant specializing in creating high-quality hiring materials.
+Your task: [TASK_OVERVIEW]
+What to look for in the user's notes: [TASK_LOOK_FORS]
+
+Do not write the job description. Instead, respond in exactly this format:
+>>User Summary: <concise summary of what the user is asking for>
+>>Model Comparison: <comparison of the user's request with your task>
+>>Model Judgement: <similarity score between 0 and 5>
+FACTS:
+- <one shared fact per bullet: company name, job title and level, location, pay range, must-have requirements, tools, benefits and any other details every section needs>
+"""
+
+JOB_DESCRIPTION_SECTION_INSTRUCTIONS = """
+You are writing the "[SECTION]" section of a job description using the shared facts below. Other sections are written separately, so do not repeat their content and do not invent facts that contradict the shared facts.
+Section guidance: [GUIDANCE]
+Language should be clear, concise and professional. Output only the body of the section, without the heading and without any notes about your process.
+Write the section so it meets the rubric criteria below.
+
+RUBRIC CRITERIA:
+[CRITERIA]
+
+SHARED FACTS:
+[FACTS]
+"""
+
+def plan_job_description(user_notes):
+    """
+    Runs the short planning call and returns the >> header lines, the shared
+    facts block and the token usage.
+    """
+    planning_instructions = (
+        JOB_DESCRIPTION_PLANNING_INSTRUCTIONS
+        .replace("[TASK_OVERVIEW]", TASK_OVERVIEWS["Write a job description"])
+        .replace("[TASK_LOOK_FORS]", TASK_LOOK_FORS["Write a job description"])
+    )
+    plan, usage = run_completion(planning_instructions, f"USER NOTES:\n{user_notes}", max_tokens=600)
+    header, _, facts = plan.partition("FACTS:")
+    return header.strip(), facts.strip(), usage
+
+def section_rubric_criteria(heading, dimensions):
+    """
+    Returns the rubric text a section is written against: the overview lines of
+    its dimension and that dimension's Level 5 descriptor.
+    """
+    number = JOB_DESCRIPTION_SECTIONS[heading]["dimension"]
+    block = next((block for block in dimensions.values() if block.startswith(f"Dimension {number}:")), "")
+    if not block:
+        return "Not available."
+    return "\n".join(block.splitlines()[:3]) + "\n" + rubric_level_excerpt(block, 5)
+
+def is_valid_plan(header, facts):
+    """
+    A plan is usable when it has the >> summary lines and at least one shared fact.
+    """
+    has_header = all(f">>{label}:" in header for label in ("User Summary", "Model Comparison", "Model Judgement"))
+    return has_header and any(BULLET_PREFIX_PATTERN.sub("", line).strip() for line in facts.splitlines())
+
+def write_job_description_section(heading, facts, dimensions, feedback=None, current_body=None):
+    """
+    Generates the body of a single job description section against its rubric
+    criteria. When feedback is given, the current body is revised to address it
+    instead.
+    """
+    section = JOB_DESCRIPTION_SECTIONS[heading]
+    instructions = (
+        JOB_DESCRIPTION_SECTION_INSTRUCTIONS
+        .replace("[SECTION]", heading)
+        .replace("[GUIDANCE]", section["guidance"])
+        .replace("[CRITERIA]", section_rubric_criteria(heading, dimensions))
+        .replace("[FACTS]", facts)
+    )
+    if feedback:
+        user_content = (
+            f"Current section:\n{current_body}\n\n"
+            f"Evaluator feedback for this section:\n{feedback}\n\n"
+            "Rewrite the section so it addresses the feedback."
+        )
+    else:
+        user_content = f"Write the {heading} section."
+    body, usage = run_completion(instructions, user_content, max_tokens=section["max_tokens"])
+    # Drop a repeated heading if the model included one despite the instructions.
+    body = re.sub(rf"^\s*\**{re.escape(heading)}\**:?\s*\n", "", body, flags=re.IGNORECASE)
+    return body.strip(), usage
+
+def write_sections_concurrently(jobs, facts):
+    """
+    Runs write_job_description_section for each (heading, feedback, current_body)
+    job on a thread pool and returns {heading: body} plus the summed usage.
+    """
+    dimensions = load_rubric_dimensions(os.path.join("reference_materials", RUBRIC_MAPPING["Write a job description"]))
+    bodies, usages = {}, []
+    with ThreadPoolExecutor(max_workers=PARALLEL_SECTION_WORKERS) as executor:
+        futures = {
+            executor.submit(write_job_description_section, heading, facts, dimensions, feedback, current_body): heading
+            for heading, feedback, current_body in jobs
+        }
+        for future in as_completed(futures):
+            body, usage = future.result()
+            bodies[futures[future]] = body
+            usages.append(usage)
+    return bodies, sum_usage(usages)
+
+def generate_job_description_parallel(user_notes):
+    """
+    Plans the shared facts, writes every section concurrently and stitches them
+    together in the required order. Returns the document, the shared facts and
+    the total token usage, or None when the planning reply is unusable and the
+    caller should fall back to a single completion. Off-task notes (model
+    judgement of 2 or less) return only the >> header lines, so the caller can
+    show the confidentiality message without writing any section.
+    """
+    header, facts, plan_usage = plan_job_description(user_notes)
+    if not is_valid_plan(header, facts):
+        print("Planning reply is missing summary lines or shared facts; falling back to a single completion")  # Log to console
+        return None
+    if is_off_task(header):
+        return header, facts, plan_usage
+    jobs = [(heading, None, None) for heading in JOB_DESCRIPTION_SECTIONS]
+    bodies, section_usage = write_sections_concurrently(jobs, facts)
+    sections = [(heading, bodies[heading]) for heading in JOB_DESCRIPTION_SECTIONS]
+    return join_sections(header, sections), facts, sum_usage([plan_usage, section_usage])
+
+def job_description_heading(heading):
+    """
+    Returns the JOB_DESCRIPTION_SECTIONS key for a heading as written in the
+    output (e.g. "About Us:"), or None if it is not one of the required sections.
+    """
+    for section in JOB_DESCRIPTION_SECTIONS:
+        if _normalize(section) == _normalize(heading):
+            return section
+    return None
+
+def find_flagged_sections(evaluator_feedback, headings):
+    """
+    Returns {heading: issues} for every heading the evaluator reported a
+    problem with on a "Section: <heading> — <issue>" line.
+    """
+    by_name = {_normalize(heading): heading for heading in headings}
+    flagged = {}
+    for verdict_heading, issue in parse_section_verdicts(evaluator_feedback):
+        heading = by_name.get(_normalize(verdict_heading))
+        if heading is not None:
+            flagged.setdefault(heading, []).append(issue)
+    return {heading: "\n".join(issues) for heading, issues in flagged.items()}
+
+def refine_job_description_sections(document, facts, evaluator_feedback):
+    """
+    Regenerates only the sections flagged by the evaluator, concurrently, and
+    returns the updated document, the refined headings and the token usage.
+    """
+    preamble, sections = split_sections(document)
+    flagged = find_flagged_sections(evaluator_feedback, [heading for heading, _ in sections if job_description_heading(heading)])
+    if not flagged:
+        return document, [], (0, 0, 0)
+    current = dict(sections)
+    jobs = [(job_description_heading(heading), feedback, current[heading]) for heading, feedback in flagged.items()]
+    bodies, usage = write_sections_concurrently(jobs, facts)
+    refined_sections = [
+        (heading, bodies[job_description_heading(heading)] if heading in flagged else body)
+        for heading, body in sections
+    ]
+    return join_sections(preamble, refined_sections), [heading for heading, _ in sections if heading in flagged], usage
+
+###############################################################################
+# Patch-Based Refinement
+###############################################################################
+# Headings every output for the task must keep, in this order of first appearance.
+PROFICIENCY_LEVELS = ["Concern", "Mild Concern", "Mixed", "Mild Strength", "Strength"]
+
+TASK_REQUIRED_HEADINGS = {
+    "Write a job description": list(JOB_DESCRIPTION_SECTIONS),
+    "Create response guides": PROFICIENCY_LEVELS
+}
+
+BULLET_PREFIX_PATTERN = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+
+# Tasks whose required headings may also appear as a bold or "Label:" prefix at line start.
+INLINE_LABEL_TASKS = {"Create response guides"}
+LINE_LABEL_PATTERN = re.compile(r"^\s*(?:[-*•]\s*)?(?:\*\*\s*([^*\n]+?)\s*\*\*|([A-Za-z][A-Za-z ]{0,40}?)\s*:)", re.MULTILINE)
+
+def make_finding(check, severity, message, section=None):
+    """
+    Builds a machine-readable finding. Severity is "error" for structural
+    failures and "warning" for coverage or length issues.
+    """
+    return {"check": check, "severity": severity, "section": section, "message": message}
+
+PATCH_REFINEMENT_INSTRUCTIONS = """
+You revise hiring content by returning targeted edits instead of rewriting the document.
+Sections are introduced by bold headings such as **Key Responsibilities**. Bullets are lines starting with "- ".
+Address every point in the evaluator feedback using as few edits as possible, and keep the document consistent with this format:
+
+[task_format]
+
+Respond with a JSON object of the form {"edits": [...]} where each edit is one of:
+{"op": "replace", "section": "<heading>", "content": "<new section body>"}
+{"op": "replace", "section": "<heading>", "bullet": "<text of existing bullet>", "content": "<new bullet text>"}
+{"op": "insert", "section": "<heading>", "after_bullet": "<optional text of existing bullet>", "content": "<new bullet text>"}
+{"op": "insert", "section": "<new heading>", "after_section": "<optional existing heading>", "content": "<new section body>"}
+{"op": "delete", "section": "<heading>", "bullet": "<text of existing bullet>"}
+{"op": "delete", "section": "<heading>"}
+When a heading appears more than once, add "occurrence": <1-based number> to pick which one.
+Do not include evaluation criteria, refinement notes or improvement suggestions in any content.
+"""
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", BULLET_PREFIX_PATTERN.sub("", text or "")).strip().rstrip(":.;, ").lower()
+
+def _find_section(sections, heading, occurrence=1):
+    seen = 0
+    for index, (existing, _) in enumerate(sections):
+        if _normalize(existing) == _normalize(heading):
+            seen += 1
+            if seen == occurrence:
+                return index
+    return None
+
+def _find_bullet(lines, bullet):
+    """
+    Returns the index of the bullet whose text equals the given text, or else
+    the only bullet that contains it. Raises ValueError when no bullet or more
+    than one bullet matches, so an ambiguous edit is never applied.
+    """
+    target = _normalize(bullet)
+    bullets = [(index, _normalize(line)) for index, line in enumerate(lines) if BULLET_PREFIX_PATTERN.match(line)]
+    if not target:
+        raise ValueError("Empty bullet reference")
+    for matches in ([index for index, text in bullets if text == target], [index for index, text in bullets if target in text]):
+        if len(matches) == 1:
+            return matches[0]
+        if len(matches) > 1:
+            raise ValueError(f"Bullet is ambiguous: {bullet!r}")
+    raise ValueError(f"Bullet not found: {bullet!r}")
+
+def _as_bullet(content):
+    return content if BULLET_PREFIX_PATTERN.match(content) else f"- {content.strip()}"
+
+def apply_section_patch(document, edits):
+    """
+    Applies section-keyed edits (see PATCH_REFINEMENT_INSTRUCTIONS) to the
+    document and returns the patched text. Raises ValueError on any edit that
+    does not match the document.
+    """
+    preamble, sections = split_sections(document)
+    for edit in edits:
+        if not isinstance(edit, dict) or edit.get("op") not in ("replace", "insert", "delete") or not edit.get("section"):
+            raise ValueError(f"Malformed edit: {edit!r}")
+        op, heading, content = edit["op"], edit["section"], edit.get("content") or ""
+        index = _find_section(sections, heading, int(edit.get("occurrence") or 1))
+
+        if op == "insert" and index is None and not edit.get("after_bullet"):
+            after = edit.get("after_section")
+            position = len(sections)
+            if after:
+                after_index = _find_section(sections, after)
+                if after_index is None:
+                    raise ValueError(f"Section not found: {after!r}")
+                position = after_index + 1
+            sections.insert(position, (heading, content.strip()))
+            continue
+        if index is None:
+            raise ValueError(f"Section not found: {heading!r}")
+
+        section_heading, body = sections[index]
+        lines = body.splitlines()
+        if op == "replace" and edit.get("bullet"):
+            lines[_find_bullet(lines, edit["bullet"])] = _as_bullet(content)
+        elif op == "replace":
+            lines = content.strip().splitlines()
+        elif op == "insert":
+            position = _find_bullet(lines, edit["after_bullet"]) + 1 if edit.get("after_bullet") else len(lines)
+            lines.insert(position, _as_bullet(content))
+        elif edit.get("bullet"):
+            del lines[_find_bullet(lines, edit["bullet"])]
+        else:
+            del sections[index]
+            continue
+        sections[index] = (section_heading, "\n".join(lines).strip())
+    patched = join_sections(preamble, sections)
+    # Headings may only change through explicit section inserts and deletes, not
+    # through bold lines smuggled into replacement content.
+    if [heading for heading, _ in split_sections(patched)[1]] != [heading for heading, _ in sections]:
+        raise ValueError("Edit content changed the document's headings")
+    return patched
+
+def document_headings(task, document):
+    """
+    Returns the normalised headings of a document in order. Response guides also
+    accept proficiency levels written as inline labels, e.g. "**Concern:** text"
+    or "Mild Strength: text".
+    """
+    if task in INLINE_LABEL_TASKS:
+        labels = [_normalize(bold or plain) for bold, plain in LINE_LABEL_PATTERN.findall(document)]
+        return [label for label in labels if label in {_normalize(required) for required in TASK_REQUIRED_HEADINGS[task]}]
+    return [_normalize(heading) for heading, _ in split_sections(document)[1]]
+
+def heading_findings(task, document):
+    """
+    Returns findings for required headings of the task that are missing from
+    the document or that appear out of order.
+    """
+    headings = document_headings(task, document)
+    findings = []
+    last_position = -1
+    for required in TASK_REQUIRED_HEADINGS.get(task, []):
+        if _normalize(required) not in headings:
+            findings.append(make_finding("missing_heading", "error", f"Missing heading: {required}", required))
+            continue
+        position = headings.index(_normalize(required))
+        if position < last_position:
+            findings.append(make_finding("heading_order", "error", f"Heading out of order: {required}", required))
+        last_position = max(last_position, position)
+    return findings
+
+def validate_heading_structure(task, document):
+    """
+    Returns a list of problems with the document's headings for the task:
+    required headings that are missing or that appear out of order.
+    """
+    return [finding["message"] for finding in heading_findings(task, document)]
+
+def validate_patched_headings(task, document, patched):
+    """
+    Returns heading problems in a patched document. Tasks with a fixed heading
+    list are checked against it; for other tasks the original headings that
+    remain must keep their order, and at least one of them must remain.
+    """
+    if task in TASK_REQUIRED_HEADINGS:
+        return validate_heading_structure(task, patched)
+    original = [_normalize(heading) for heading, _ in split_sections(document)[1]]
+    patched_headings = [_normalize(heading) for heading, _ in split_sections(patched)[1]]
+    kept = [heading for heading in patched_headings if heading in original]
+    if original and not kept:
+        return ["Patch removed every original section"]
+    expected = [heading for heading in original if heading in kept]
+    if kept != expected:
+        return ["Patch reordered the original sections"]
+    return []
+
+def refine_with_patch(task, document, evaluator_feedback):
+    """
+    Asks the model for section-keyed edits and applies them locally. Returns the
+    patched document, or None when the patch is invalid and the caller should
+    fall back to regeneration, together with the token usage of the call.
+    """
+    _, sections = split_sections(document)
+    if not sections:
+        return None, (0, 0, 0)
+    instructions = PATCH_REFINEMENT_INSTRUCTIONS.replace("[task_format]", TASK_FORMAT_DEFINITIONS[task].strip())
+    user_content = (
+        f"Document:\n{document}\n\n"
+        f"Evaluator feedback:\n{evaluator_feedback}"
+    )
+    try:
+        patch_text, usage = run_completion(instructions, user_content, response_format={"type": "json_object"})
+    except Exception as e:
+        print(f"Patch refinement error: {str(e)}")  # Log to console
+        return None, (0, 0, 0)
+    try:
+        edits = json.loads(patch_text).get("edits")
+        if not isinstance(edits, list):
+            raise ValueError("Patch has no edits list")
+        patched = apply_section_patch(document, edits)
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"Patch rejected, falling back to regeneration: {str(e)}")  # Log to console
+        return None, usage
+    problems = validate_patched_headings(task, document, patched)
+    if problems:
+        print(f"Patch rejected, falling back to regeneration: {'; '.join(problems)}")  # Log to console
+        return None, usage
+    return patched, usage
+
+###############################################################################
+# Local Structural Pre-Scorer
+###############################################################################
+# Outputs shorter than this are treated as truncated or off-task.
+TASK_MIN_WORDS = {
+    "Write a job description": 250,
+    "Build Interview Questions": 60,
+    "Create response guides": 150,
+    "Evaluate candidate responses": 80
+}
+
+JOB_DESCRIPTION_BULLET_SECTIONS = ["Key Responsibilities", "Requirements", "Benefits"]
+ABOUT_US_MAX_WORDS = 150
+SCORE_PATTERN = re.compile(r"score[^\n]*?\b[1-5](?:\.\d)?\b", re.IGNORECASE)
+OVERALL_SCORE_PATTERN = re.compile(r"overall[^\n]*?\b[1-5](?:\.\d)?\b", re.IGNORECASE)
+QUESTION_LINE_PATTERN = re.compile(r"^\s*(?:Q\d+\b|Question\s*\d+\b|.*\?\s*$)", re.IGNORECASE | re.MULTILINE)
+QUESTION_HEADING_PATTERN = re.compile(r"^\W*(?:Q\d+|Question\s*\d+)\b", re.IGNORECASE | re.MULTILINE)
+
+def _score_job_description(document, sections, user_input):
+    findings = []
+    for heading, body in sections:
+        section = job_description_heading(heading)
+        if section is None:
+            continue
+        if not body.strip():
+            findings.append(make_finding("empty_section", "error", f"Section is empty: {section}", heading))
+        elif section == "About Us" and len(body.split()) > ABOUT_US_MAX_WORDS:
+            findings.append(make_finding("section_length", "warning", f"About Us has {len(body.split())} words; keep it under {ABOUT_US_MAX_WORDS}.", heading))
+        elif section in JOB_DESCRIPTION_BULLET_SECTIONS and not any(BULLET_PREFIX_PATTERN.match(line) for line in body.splitlines()):
+            findings.append(make_finding("bullet_format", "warning", f"{section} should use bullet points.", heading))
+        elif section == "Salary" and not re.search(r"\d", body):
+            findings.append(make_finding("salary_range", "warning", "Salary does not state a numeric range.", heading))
+    return findings
+
+def _score_interview_questions(document, sections, user_input):
+    findings = []
+    question_sections = [(heading, body) for heading, body in sections if re.search(r"main question", body, re.IGNORECASE)]
+    if not question_sections:
+        findings.append(make_finding("missing_questions", "error", "No questions in the \"Main Question:\" format were found."))
+    for heading, body in question_sections:
+        if not re.search(r"follow-?up", body, re.IGNORECASE):
+            findings.append(make_finding("missing_follow_ups", "warning", f"Question has no follow-up questions: {heading}", heading))
+    return findings
+
+def _score_response_guides(document, sections, user_input):
+    findings = []
+    counts = {level: 0 for level in PROFICIENCY_LEVELS}
+    for heading in document_headings("Create response guides", document):
+        for level in PROFICIENCY_LEVELS:
+            if heading == _normalize(level):
+                counts[level] += 1
+    question_sets = max(counts.values())
+    for level, count in counts.items():
+        # Missing levels are already reported by the required heading check.
+        if 0 < count < question_sets:
+            findings.append(make_finding("incomplete_proficiency_levels", "error", f"{level} appears for {count} of {question_sets} questions.", level))
+    return findings
+
+def _score_candidate_evaluation(document, sections, user_input):
+    findings = []
+    # An "Overall" score line, or else the first score line above the first
+    # question, is the overall score. Only a document without any score is an error.
+    first_question = QUESTION_HEADING_PATTERN.search(document)
+    lead = document[:first_question.start()] if first_question else document
+    overall = OVERALL_SCORE_PATTERN.search(document)
+    if overall:
+        question_text = OVERALL_SCORE_PATTERN.sub("", document)
+    else:
+        overall = SCORE_PATTERN.search(lead)
+        question_text = document[:overall.start()] + document[overall.end():] if overall else document
+    question_scores = len(SCORE_PATTERN.findall(question_text))
+    expected_questions = len(QUESTION_LINE_PATTERN.findall(user_input or ""))
+    if not overall and question_scores == 0:
+        findings.append(make_finding("missing_scores", "error", "No 1-5 scores were found."))
+        return findings
+    if not overall:
+        findings.append(make_finding("missing_overall_score", "warning", "No overall 1-5 score was found above the first question."))
+    if question_scores == 0:
+        findings.append(make_finding("missing_question_scores", "warning", "No per-question 1-5 scores were found."))
+    elif question_scores < expected_questions:
+        findings.append(make_finding("missing_question_scores", "warning", f"Found {question_scores} per-question scores for {expected_questions} questions."))
+    return findings
+
+TASK_PRESCORERS = {
+    "Write a job description": _score_job_description,
+    "Build Interview Questions": _score_interview_questions,
+    "Create response guides": _score_response_guides,
+    "Evaluate candidate responses": _score_candidate_evaluation
+}
+
+def prescore_output(task, document, user_input=""):
+    """
+    Runs the deterministic structure, coverage and length checks for the task
+    and returns a list of findings (see make_finding).
+    """
+    _, sections = split_sections(document)
+    findings = heading_findings(task, document)
+    word_count = len(document.split())
+    if word_count < TASK_MIN_WORDS.get(task, 0):
+        findings.append(make_finding("too_short", "error", f"Output has {word_count} words; expected at least {TASK_MIN_WORDS[task]}."))
+    scorer = TASK_PRESCORERS.get(task)
+    if scorer is not None:
+        findings.extend(scorer(document, sections, user_input))
+    return findings
+
+def has_structural_failure(findings):
+    return any(finding["severity"] == "error" for finding in findings)
+
+def local_score(findings):
+    """
+    Maps findings onto the evaluator's 0-5 scale: each error costs two points
+    and each warning one.
+    """
+    errors = sum(1 for finding in findings if finding["severity"] == "error")
+    return max(0, 5 - 2 * errors - (len(findings) - errors))
+
+def format_findings(findings):
+    """
+    Formats findings as evaluator-style feedback so they can drive refinement directly.
+    """
+    if not findings:
+        return "No structural issues found."
+    # Findings tied to a section use the evaluator's "Section: <heading> — <issue>" form.
+    return "\n".join(
+        f"- Section: {finding['section']} — [{finding['severity']}] {finding['message']}" if finding["section"]
+        else f"- [{finding['severity']}] {finding['message']}"
+        for finding in findings
+    )
+
+###############################################################################
+# Fan-Out Candidate Evaluation
+###############################################################################
+MAX_QUESTION_WORKERS = 8
+DIMENSIONS_PER_QUESTION = 2
+
+QUESTION_MARKER_PATTERN = re.compile(r"^\s*\**\s*(?:Q(?:uestion)?\s*\d*)\s*\**\s*[:.)\-]\s*\**\s*(.*)$", re.IGNORECASE)
+ANSWER_MARKER_PATTERN = re.compile(r"^\s*\**\s*(?:A(?:nswer)?\s*\d*|Response\s*\d*|Candidate(?: Response)?)\s*\**\s*[:.)\-]\s*\**\s*(.*)$", re.IGNORECASE)
+QUESTION_LIST_HEADER_PATTERN = re.compile(r"^\W*(?:Interview\s+)?Questions(?:\s+Asked)?\s*\**\s*:?\s*\**\s*(.*)$", re.IGNORECASE)
+ANSWER_LIST_HEADER_PATTERN = re.compile(r"^\W*(?:Candidate(?:'s)?\s+)?(?:Responses|Answers)\s*\**\s*:?\s*\**\s*(.*)$", re.IGNORECASE)
+NUMBERED_ITEM_PATTERN = re.compile(r"^\s*(?:[-*]\s*)?\**\s*(?:Q(?:uestion)?|A(?:nswer)?|R(?:esponse)?)?\s*(\d+)\s*\**\s*[:.)\-]\s*\**\s*(.*)$", re.IGNORECASE)
+DIMENSION_HEADING_PATTERN = re.compile(r"^Dimension\s+(\d+):\s*(.+?)\s*$", re.MULTILINE)
+RUBRIC_LEVEL_PATTERN = re.compile(r"^Level\s+(\d)\s*\((.+?)\)", re.MULTILINE)
+CHARACTERISTICS_PATTERN = re.compile(r"^\W*Characteristics:\s*(.+?)\s*$", re.MULTILINE)
+
+CANDIDATE_QUESTION_INSTRUCTIONS = """
+You are an expert interviewer scoring one candidate answer using the NexaTalent Rubric for Candidate Responses.
+Score the answer from 1 to 5 against only the rubric dimensions below, citing examples from the answer and connecting them to the rubric.
+Respond in exactly this format:
+Score: <1-5>
+<one short justification paragraph>
+
+RUBRIC DIMENSIONS:
+[DIMENSIONS]
+"""
+
+CANDIDATE_AGGREGATION_INSTRUCTIONS = """
+You are an expert interviewer combining per-question scores into an overall evaluation using the NexaTalent Rubric for Candidate Responses.
+Your task: [TASK_OVERVIEW]
+What to look for in the user's notes: [TASK_LOOK_FORS]
+Base the overall score on the rubric levels below.
+Respond in exactly this format:
+>>User Summary: <concise summary of what the user is asking for>
+>>Model Comparison: <comparison of the user's request with your task>
+>>Model Judgement: <similarity score between 0 and 5>
+Overall Score: <1-5>
+<one justification paragraph citing the strongest and weakest answers>
+
+RUBRIC LEVELS:
+[LEVELS]
+"""
+
+def _numbered_list(lines):
+    """
+    Returns {number: text} for a numbered list, joining continuation lines onto
+    their item, or None when the list has unnumbered text or repeated numbers.
+    """
+    items, number = {}, None
+    for line in lines:
+        if not line.strip():
+            continue
+        item_match = NUMBERED_ITEM_PATTERN.match(line)
+        if item_match:
+            number = int(item_match.group(1))
+            if number in items:
+                return None
+            items[number] = item_match.group(2).strip()
+        elif number is None:
+            return None
+        else:
+            items[number] = f"{items[number]}\n{line.strip()}".strip()
+    return items
+
+def _split_separate_lists(lines):
+    """
+    Splits notes laid out as a numbered "Questions Asked" list followed by a
+    numbered "Candidate Responses" list, matching questions to answers by
+    number. Returns None when the notes are not in this layout or the numbers
+    do not line up.
+    """
+    question_header = next((index for index, line in enumerate(lines) if QUESTION_LIST_HEADER_PATTERN.match(line)), None)
+    if question_header is None:
+        return None
+    answer_header = next((index for index, line in enumerate(lines) if index > question_header and ANSWER_LIST_HEADER_PATTERN.match(line)), None)
+    if answer_header is None:
+        return None
+    # The responses list ends at the next bold heading, e.g. "**Focus Areas**".
+    answer_end = next((index for index in range(answer_header + 1, len(lines)) if SECTION_HEADING_PATTERN.match(lines[index])), len(lines))
+    questions = _numbered_list([QUESTION_LIST_HEADER_PATTERN.match(lines[question_header]).group(1)] + lines[question_header + 1:answer_header])
+    answers = _numbered_list([ANSWER_LIST_HEADER_PATTERN.match(lines[answer_header]).group(1)] + lines[answer_header + 1:answer_end])
+    if not questions or not answers or set(questions) != set(answers):
+        return None
+    context = "\n".join(lines[:question_header] + lines[answer_end:]).strip()
+    return context, [(questions[number], answers[number]) for number in sorted(questions)]
+
+def split_question_answer_pairs(text):
+    """
+    Splits pasted interview notes into the leading context and a list of
+    (question, answer) pairs, or returns None when the notes cannot be split.
+    Separate numbered question and response lists are matched by number;
+    otherwise questions need "Q1:"/"Question 1:" markers, each followed by its
+    answer. Lines ending in "?" inside an answer stay part of that answer, and
+    a question followed directly by another question means the notes cannot be
+    split.
+    """
+    lines = text.splitlines()
+    separate = _split_separate_lists(lines)
+    if separate is not None:
+        return separate
+    if not any(QUESTION_MARKER_PATTERN.match(line) for line in lines):
+        return None
+    context_lines, pairs = [], []
+    question, answer_lines, in_answer = None, [], False
+    for line in lines:
+        question_match = QUESTION_MARKER_PATTERN.match(line)
+        if question_match:
+            if question is not None:
+                if not "\n".join(answer_lines).strip():
+                    return None
+                pairs.append((question, "\n".join(answer_lines).strip()))
+            question = question_match.group(1).strip()
+            answer_lines, in_answer = [], False
+        elif question is None:
+            context_lines.append(line)
+        else:
+            answer_match = ANSWER_MARKER_PATTERN.match(line)
+            if answer_match:
+                in_answer = True
+                answer_lines.append(answer_match.group(1))
+            elif not in_answer and not answer_lines and not question.endswith("?"):
+                # The question text continues until it ends with "?" or an answer marker appears.
+                question = f"{question} {line.strip()}".strip()
+            elif line.strip() or answer_lines:
+                answer_lines.append(line)
+    if question is not None:
+        if not "\n".join(answer_lines).strip():
+            return None
+        pairs.append((question, "\n".join(answer_lines).strip()))
+    return "\n".join(context_lines).strip(), pairs
+
+def parse_rubric_dimensions(rubric_text):
+    """
+    Returns {dimension title: rubric block} for every "Dimension N: Title" block
+    that has level descriptors, keeping the first copy of each dimension.
+    Overview blocks without levels are skipped.
+    """
+    body = rubric_text
+    end = body.find("\n=======")
+    if end != -1:
+        body = body[:end]
+    matches = list(DIMENSION_HEADING_PATTERN.finditer(body))
+    dimensions = {}
+    for index, match in enumerate(matches):
+        block_end = matches[index + 1].start() if index + 1 < len(matches) else len(body)
+        block = body[match.start():block_end].strip()
+        if RUBRIC_LEVEL_PATTERN.search(block):
+            dimensions.setdefault(match.group(2), block)
+    return dimensions
+
+def rubric_level_excerpt(block, level):
+    """
+    Returns the text of one "Level N (...)" descriptor within a dimension block.
+    """
+    match = re.search(rf"^Level\s+{level}\b.*?(?=^Level\s+\d|\Z)", block, re.MULTILINE | re.DOTALL)
+    return match.group(0).strip() if match else ""
+
+def rubric_level_descriptors(dimensions):
+    """
+    Returns each dimension's title with its "Level N (...)" lines and their
+    one-line characteristics, a compact summary of the rubric levels.
+    """
+    lines = []
+    for block in dimensions.values():
+        lines.append(block.splitlines()[0])
+        for match in RUBRIC_LEVEL_PATTERN.finditer(block):
+            characteristics = CHARACTERISTICS_PATTERN.search(rubric_level_excerpt(block, match.group(1)))
+            lines.append(f"- {match.group(0)}: {characteristics.group(1) if characteristics else ''}".rstrip(": "))
+    return "\n".join(lines) or "Not available."
+
+def _keywords(text):
+    return {word for word in re.findall(r"[a-z]+", text.lower()) if len(word) > 3}
+
+def select_dimensions(question, answer, dimensions, limit=DIMENSIONS_PER_QUESTION):
+    """
+    Picks the rubric dimensions whose title, "Includes" and rationale lines share
+    the most keywords with the question and answer.
+    """
+    pair_keywords = _keywords(f"{question} {answer}")
+    ranked = sorted(
+        dimensions.items(),
+        key=lambda item: len(pair_keywords & _keywords(" ".join(item[1].splitlines()[:3]))),
+        reverse=True
+    )
+    return dict(ranked[:limit])
+
+def score_candidate_question(context, question, answer, dimensions, feedback=None):
+    """
+    Scores a single question/answer pair against its relevant dimensions and
+    returns a result dict with the score, justification and token usage.
+    """
+    relevant = select_dimensions(question, answer, dimensions)
+    instructions = CANDIDATE_QUESTION_INSTRUCTIONS.replace("[DIMENSIONS]", "\n\n".join(relevant.values()))
+    user_content = (
+        f"Interview context:\n{context or 'Not provided.'}\n\n"
+        f"Question:\n{question}\n\n"
+        f"Candidate answer:\n{answer}"
+    )
+    if feedback:
+        user_content += f"\n\nReviewer feedback on the previous scoring of this answer:\n{feedback}"
+    text, usage = run_completion(instructions, user_content, max_tokens=350)
+    score_match = re.search(r"Score:\s*([1-5])", text)
+    justification = re.sub(r"^\s*Score:\s*[1-5][^\n]*\n?", "", text).strip()
+    return {
+        "question": question,
+        "answer": answer,
+        "dimensions": list(relevant),
+        "score": int(score_match.group(1)) if score_match else None,
+        "justification": justification,
+        "usage": usage
+    }
+
+def score_candidate_questions(context, pairs, dimensions, feedback=None):
+    """
+    Scores {index: (question, answer)} pairs concurrently and returns
+    {index: result}. Feedback, when given, maps an index to reviewer notes.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(MAX_QUESTION_WORKERS, len(pairs)) or 1) as executor:
+        futures = {
+            executor.submit(score_candidate_question, context, question, answer, dimensions, (feedback or {}).get(index)): index
+            for index, (question, answer) in pairs.items()
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+def aggregate_candidate_evaluation(fanout, feedback=None):
+    """
+    Runs the short aggregation call over the per-question scores and stores the
+    >> header lines and overall score text on the fan-out state. Feedback on a
+    previous overall evaluation, when given, is passed along for the retry.
+    """
+    instructions = (
+        CANDIDATE_AGGREGATION_INSTRUCTIONS
+        .replace("[TASK_OVERVIEW]", TASK_OVERVIEWS["Evaluate candidate responses"])
+        .replace("[TASK_LOOK_FORS]", TASK_LOOK_FORS["Evaluate candidate responses"])
+        .replace("[LEVELS]", rubric_level_descriptors(load_rubric_dimensions(fanout["rubric_file_path"])))
+    )
+    scores = "\n\n".join(
+        f"Question {number}: {result['question']}\nScore: {result['score']}\n{result['justification']}"
+        for number, result in enumerate(fanout["results"], start=1)
+    )
+    user_content = f"Interview context:\n{fanout['context'] or 'Not provided.'}\n\nPer-question scores:\n{scores}"
+    if feedback:
+        user_content += f"\n\nReviewer feedback on the previous overall evaluation:\n{feedback}"
+    text, usage = run_completion(instructions, user_content, max_tokens=400)
+    header, marker, overall = text.partition("Overall Score:")
+    fanout["header"] = header.strip() if marker else ""
+    fanout["overall"] = f"Overall Score:{overall}".strip() if marker else text
+    return usage
+
+def rescore_unscored_questions(fanout, dimensions):
+    """
+    Retries once every per-question result whose score could not be parsed and
+    returns the token usage of the retries.
+    """
+    retry_feedback = {
+        index: "The previous reply did not start with 'Score: <1-5>'. Follow the response format exactly."
+        for index, result in enumerate(fanout["results"]) if result["score"] is None
+    }
+    if not retry_feedback:
+        return (0, 0, 0)
+    pairs = {index: (fanout["results"][index]["question"], fanout["results"][index]["answer"]) for index in retry_feedback}
+    results = score_candidate_questions(fanout["context"], pairs, dimensions, retry_feedback)
+    for index, result in results.items():
+        fanout["results"][index] = result
+    return sum_usage([result["usage"] for result in results.values()])
+
+def compose_candidate_evaluation(fanout):
+    sections = [("Overall Evaluation", fanout["overall"])]
+    sections.extend(
+        (f"Question {number}: {result['question']}", f"Score: {result['score'] if result['score'] is not None else 'Not scored'}\n{result['justification']}")
+        for number, result in enumerate(fanout["results"], start=1)
+    )
+    return join_sections(fanout["header"], sections)
+
+def evaluate_candidate_fanout(user_notes, rubric_file_path):
+    """
+    Scores each question/answer pair concurrently and aggregates the overall
+    score. Returns the fan-out state (context, per-question results, document
+    and usage), or None when the notes do not split into at least two pairs.
+    """
+    split = split_question_answer_pairs(user_notes)
+    dimensions = load_rubric_dimensions(rubric_file_path)
+    if split is None or len(split[1]) < 2 or not dimensions:
+        return None
+    context, pairs = split
+    results = score_candidate_questions(context, dict(enumerate(pairs)), dimensions)
+    fanout = {"context": context, "rubric_file_path": rubric_file_path, "results": [results[index] for index in range(len(pairs))]}
+    scoring_usage = sum_usage([result["usage"] for result in fanout["results"]])
+    retry_usage = rescore_unscored_questions(fanout, dimensions)
+    aggregate_usage = aggregate_candidate_evaluation(fanout)
+    fanout["usage"] = sum_usage([scoring_usage, retry_usage, aggregate_usage])
+    fanout["document"] = compose_candidate_evaluation(fanout)
+    return fanout
+
+def rescore_candidate_questions(fanout, feedback, overall_feedback=None):
+    """
+    Re-scores only the questions in {index: feedback} (feedback may be empty),
+    retries any unscored question, re-runs the aggregation with the optional
+    overall feedback and returns the updated document and token usage.
+    """
+    dimensions = load_rubric_dimensions(fanout["rubric_file_path"])
+    usages = []
+    if feedback:
+        pairs = {index: (fanout["results"][index]["question"], fanout["results"][index]["answer"]) for index in feedback}
+        results = score_candidate_questions(fanout["context"], pairs, dimensions, feedback)
+        for index, result in results.items():
+            fanout["results"][index] = result
+        usages.extend(result["usage"] for result in results.values())
+    usages.append(rescore_unscored_questions(fanout, dimensions))
+    usages.append(aggregate_candidate_evaluation(fanout, overall_feedback))
+    fanout["document"] = compose_candidate_evaluation(fanout)
+    return fanout["document"], sum_usage(usages)
+
+def split_candidate_feedback(evaluator_feedback, question_count, structural=False):
+    """
+    Splits evaluator feedback into {index: issues} for the questions it flags
+    and the remaining feedback on the overall evaluation. For structural
+    pre-scorer feedback, findings not tied to a section (such as a missing
+    overall score) also count as overall feedback.
+    """
+    flagged, overall = {}, []
+    for heading, issue in parse_section_verdicts(evaluator_feedback):
+        match = re.match(r"Question\s+(\d+)\b", heading, re.IGNORECASE)
+        index = int(match.group(1)) - 1 if match else None
+        if index is not None and 0 <= index < question_count:
+            flagged.setdefault(index, []).append(issue)
+        else:
+            overall.append(f"{heading}: {issue}")
+    if structural:
+        overall.extend(
+            line.strip() for line in evaluator_feedback.splitlines()
+            if line.strip() and not SECTION_VERDICT_PATTERN.match(line)
+        )
+    return {index: "\n".join(issues) for index, issues in flagged.items()}, "\n".join(overall)
+
 ###############################################################################
 # Streamlit UI and Integration
 ###############################################################################
@@ -584,6 +1720,30 @@ with col2:
 with st.expander("Need help getting started?"):
     st.markdown(TASK_INSTRUCTIONS[task])
 
+# Section-level parallel generation is only available for job descriptions.
+parallel_mode = False
+if task == "Write a job description":
+    parallel_mode = st.checkbox(
+        "Generate sections in parallel",
+        value=True,
+        help="Writes each job description section at the same time and only refines the sections the evaluator flags."
+    )
+
+patch_mode = st.checkbox(
+    "Refine with targeted edits",
+    value=True,
+    help="Applies the evaluator's suggestions as edits to individual sections instead of rewriting the whole document. Section-by-section job descriptions always rewrite only the flagged sections."
+)
+
+# Per-question fan-out scoring is only available for candidate evaluations.
+fanout_mode = False
+if task == "Evaluate candidate responses":
+    fanout_mode = st.checkbox(
+        "Score each question separately",
+        value=True,
+        help="Scores every question and answer at the same time, then combines them into an overall score. Single questions can be re-scored afterwards."
+    )
+
 # Initialize session state for input method if not exists
 if 'input_method' not in st.session_state:
     st.session_state.input_method = "paste"  # default to paste
@@ -600,7 +1760,18 @@ else:
         else:
             st.error("Currently, only plain text files are supported. Please upload a .txt file.")
 
-@st.cache_data
+RUBRIC_MAPPING = {
+    "Write a job description": "NexaTalent Rubric for Job Description Evaluation.txt",
+    "Build Interview Questions": "NexaTalent Rubric for Interview Question Generation.txt",
+    "Create response guides": "NexaTalent Rubric for Candidate Responses.txt",
+    "Evaluate candidate responses": "NexaTalent Rubric for Candidate Responses.txt"
+}
+
+CONFIDENTIALITY_MESSAGE = "It looks like you may be trying to complete a task that this tool hasn't yet been fine-tuned to handle. At NexaTalent, we are committed to delivering tools that meet or exceed our rigorous quality standards. This commitment drives our mission to improve the quality of organizations through technology and data-driven insights.\n\nIf you have questions about how our app works or the types of tasks it specializes in, please feel free to reach out to us at info@nexatalent.com."
+
+# cache_resource keeps a single shared copy per process instead of handing every
+# session a freshly unpickled copy of the rubric text.
+@st.cache_resource
 def load_rubric(file_path):
     if os.path.exists(file_path):
         with open(file_path, "r", encoding="utf-8") as file:
@@ -608,6 +1779,57 @@ def load_rubric(file_path):
     else:
         return None
 
+@st.cache_resource
+def build_final_instructions(task):
+    """
+    Returns the rubric context and the assembled system instructions for a task.
+    Both only depend on the task, so they are built once per process and shared.
+    """
+    rubric_file_path = os.path.join("reference_materials", RUBRIC_MAPPING.get(task, ""))
+    rubric_context = load_rubric(rubric_file_path)
+    final_instructions = (
+        "Rubric Context:\n" + (rubric_context or "") + "\n\n" +
+        MASTER_INSTRUCTIONS
+        .replace("[TASK_OVERVIEW]", TASK_OVERVIEWS[task])
+        .replace("[TASK_LOOK_FORS]", TASK_LOOK_FORS[task])
+        .replace("[task_format]", TASK_FORMAT_DEFINITIONS[task].strip())
+        .replace("[confidentiality_message]", CONFIDENTIALITY_MESSAGE)
+        + "\n\n"
+        "# ADDITIONAL NOTE #\n"
+        "Only provide the final output per the #RESPONSE# section. Do not include any chain-of-thought, steps, or internal reasoning. Do not include your own evaluations of your work in the final output. Do not indicate that the final version you generate has been revised or adapated based on feedback"
+    )
+    return rubric_context, final_instructions
+
+@st.cache_resource
+def load_rubric_dimensions(file_path):
+    rubric_context = load_rubric(file_path)
+    return parse_rubric_dimensions(rubric_context) if rubric_context else {}
+
+# Formatting dimensions are covered by the local pre-scorer, so the evaluator
+# only sees the substantive dimensions of a rubric.
+STRUCTURAL_RUBRIC_DIMENSIONS = {"Accessibility and Readability", "Structure and Flexibility"}
+
+@st.cache_resource
+def load_focused_rubric(task):
+    """
+    Returns the task's rubric dimensions without the structural ones and without
+    the rubric's duplicated copy, or the full rubric when no dimension parses.
+    """
+    file_path = os.path.join("reference_materials", RUBRIC_MAPPING[task])
+    dimensions = load_rubric_dimensions(file_path)
+    focused = [block for title, block in dimensions.items() if title not in STRUCTURAL_RUBRIC_DIMENSIONS]
+    return "\n\n".join(focused) if focused else (load_rubric(file_path) or "")
+
+def clean_generated_output(text):
+    # Clean the output by removing everything before the first "**"
+    if "**" in text:
+        text = "**" + text.split("**", 1)[1]
+    return text.strip()
+
+if "artifacts" not in st.session_state:
+    st.session_state.artifacts = SessionArtifactStore()
+artifacts = st.session_state.artifacts
+
 if st.button("Generate"):
     if not user_notes.strip():
         st.warning("Please provide text or upload a file with valid content.")
@@ -616,122 +1838,194 @@ if st.button("Generate"):
         spinner_text = SPINNER_TEXTS[task]
         
         with st.spinner(spinner_text):
-            chosen_task_format = TASK_FORMAT_DEFINITIONS[task]
-            chosen_task_overview = TASK_OVERVIEWS[task]
-            chosen_task_look_fors = TASK_LOOK_FORS[task]
-
-            rubric_mapping = {
-                "Write a job description": "NexaTalent Rubric for Job Description Evaluation.txt",
-                "Build Interview Questions": "NexaTalent Rubric for Interview Question Generation.txt",
-                "Create response guides": "NexaTalent Rubric for Candidate Responses.txt",
-                "Evaluate candidate responses": "NexaTalent Rubric for Candidate Responses.txt"
-            }
-            rubric_file_path = os.path.join("reference_materials", rubric_mapping.get(task, ""))
-            rubric_context = load_rubric(rubric_file_path)
+            rubric_context, final_instructions = build_final_instructions(task)
             if rubric_context is None:
                 st.warning(f"Rubric file not found for task: {task}")
                 rubric_context = ""
-            
-            final_instructions = (
-                "Rubric Context:\n" + rubric_context + "\n\n" +
-                MASTER_INSTRUCTIONS
-                .replace("[TASK_OVERVIEW]", chosen_task_overview)
-                .replace("[TASK_LOOK_FORS]", chosen_task_look_fors)
-                .replace("[task_format]", chosen_task_format.strip())
-                .replace("[confidentiality_message]", "It looks like you may be trying to complete a task that this tool hasn't yet been fine-tuned to handle. At NexaTalent, we are committed to delivering tools that meet or exceed our rigorous quality standards. This commitment drives our mission to improve the quality of organizations through technology and data-driven insights.\n\nIf you have questions about how our app works or the types of tasks it specializes in, please feel free to reach out to us at info@nexatalent.com.")
-                + "\n\n"
-                "# ADDITIONAL NOTE #\n"
-                "Only provide the final output per the #RESPONSE# section. Do not include any chain-of-thought, steps, or internal reasoning. Do not include your own evaluations of your work in the final output. Do not indicate that the final version you generate has been revised or adapated based on feedback"
-            )
+
+            # State from a previous run is no longer needed once a new one starts.
+            artifacts.clear()
             
             try:
-                # Step 1: Generate initial content.
-                response = openai.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": final_instructions},
-                        {"role": "user", "content": f"USER NOTES:\n{user_notes}"}
-                    ],
-                    temperature=0.7
-                )
-                
-                initial_output = response.choices[0].message.content.strip()
-                
-                usage = getattr(response, "usage", None)
-                if usage is not None:
-                    prompt_tokens = usage.prompt_tokens
-                    completion_tokens = usage.completion_tokens
-                    total_tokens = usage.total_tokens
+                parallel_sections = task == "Write a job description" and parallel_mode
+                generation_started = time.perf_counter()
+                candidate_fanout = None
+                parallel_result = None
+                if parallel_sections:
+                    # Step 1: Plan the shared facts, then write every section concurrently.
+                    # Falls through to a single completion when the planning reply is unusable.
+                    parallel_result = generate_job_description_parallel(user_notes)
+                    parallel_sections = parallel_result is not None
+                if task == "Evaluate candidate responses" and fanout_mode:
+                    # Step 1: Score each question/answer pair concurrently, then aggregate.
+                    # Falls through to a single completion when the notes do not split into pairs.
+                    candidate_fanout = evaluate_candidate_fanout(user_notes, os.path.join("reference_materials", RUBRIC_MAPPING[task]))
+                if parallel_sections:
+                    initial_output, facts, (prompt_tokens, completion_tokens, total_tokens) = parallel_result
+                elif candidate_fanout is not None:
+                    initial_output = candidate_fanout["document"]
+                    prompt_tokens, completion_tokens, total_tokens = candidate_fanout["usage"]
                 else:
-                    prompt_tokens = completion_tokens = total_tokens = ""
+                    # Step 1: Generate initial content.
+                    response = openai.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=[
+                            {"role": "system", "content": final_instructions},
+                            {"role": "user", "content": f"USER NOTES:\n{user_notes}"}
+                        ],
+                        temperature=0.7
+                    )
+                    
+                    initial_output = response.choices[0].message.content.strip()
+                    
+                    usage = getattr(response, "usage", None)
+                    if usage is not None:
+                        prompt_tokens = usage.prompt_tokens
+                        completion_tokens = usage.completion_tokens
+                        total_tokens = usage.total_tokens
+                    else:
+                        prompt_tokens = completion_tokens = total_tokens = ""
+                print(f"[timing] task={task} parallel={parallel_sections or candidate_fanout is not None} initial_generation={time.perf_counter() - generation_started:.1f}s")  # Log to console
                 
                 # Extract evaluation parts
                 user_summary, model_comparison, model_judgement = extract_evaluation_parts(initial_output)
                 
-                # Step 2: Evaluate the initial output using OpenAI.
-                score, evaluator_feedback = evaluate_content(initial_output, rubric_context)
-                
-                # Step 3: Refine the content using evaluator feedback.
-                refinement_instructions = (
-                    f"The following content was generated:\n{initial_output}\n\n"
-                    f"The evaluator provided the following feedback:\n{evaluator_feedback}\n\n"
-                    f"Please refine the content based on the feedback and ensure it follows this format:\n\n"
-                    f"{TASK_FORMAT_DEFINITIONS[task]}\n\n"
-                    "Important: Do not include any evaluation criteria, refinement notes, or improvement suggestions in the final output."
-                )
-                refined_response = openai.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": final_instructions},
-                        {"role": "user", "content": refinement_instructions}
-                    ],
-                    temperature=0.7
+                # Off-task notes stop here, as in the single-completion path: the
+                # confidentiality message is shown and nothing is evaluated or refined.
+                off_task = (parallel_sections and is_off_task(initial_output)) or (
+                    candidate_fanout is not None and is_off_task(candidate_fanout["header"])
                 )
-                refined_output = refined_response.choices[0].message.content.strip()
+                if off_task:
+                    print(f"[judgement] task={task} model_judgement={parse_model_judgement(initial_output)} off_task=True")  # Log to console
+                    log_to_google_sheets(
+                        tool_selection=task,
+                        user_input=user_notes,
+                        initial_output=initial_output,
+                        evaluator_feedback="",
+                        evaluator_score="",
+                        refined_output=CONFIDENTIALITY_MESSAGE,
+                        feedback="Off-task: evaluation and refinement skipped",
+                        prompt_tokens=prompt_tokens,
+                        completion_tokens=completion_tokens,
+                        total_tokens=total_tokens,
+                        user_summary=user_summary,
+                        model_comparison=model_comparison,
+                        model_judgement=model_judgement
+                    )
+                    report_session_memory(artifacts, stage="generate")
+                    st.warning(CONFIDENTIALITY_MESSAGE)
+                else:
+                    # Step 2: Check structure locally, then evaluate the substance using OpenAI.
+                    prescore_started = time.perf_counter()
+                    findings = prescore_output(task, initial_output, user_notes)
+                    print(f"[timing] task={task} prescore={(time.perf_counter() - prescore_started) * 1000:.1f}ms findings={len(findings)}")  # Log to console
+                    if has_structural_failure(findings):
+                        # Structural failures go straight to refinement without the evaluator call.
+                        score = local_score(findings)
+                        evaluator_feedback = format_findings(findings)
+                    else:
+                        score, evaluator_feedback = evaluate_content(initial_output, load_focused_rubric(task), findings)
                 
-                # Move the logging here, after all data is available
-                log_to_google_sheets(
-                    tool_selection=task,
-                    user_input=user_notes,
-                    initial_output=initial_output,
-                    evaluator_feedback=evaluator_feedback,
-                    evaluator_score=score,
-                    refined_output=refined_output,
-                    feedback=f"Refinement based on evaluator score: {score}",
-                    prompt_tokens=prompt_tokens,
-                    completion_tokens=completion_tokens,
-                    total_tokens=total_tokens,
-                    user_summary=user_summary,
-                    model_comparison=model_comparison,
-                    model_judgement=model_judgement
-                )
-
-                # Step 4: Check the refined output for model judgement value.
-                model_judgement_value = None
-                judgement_match = re.search(r"\{model_judgement\}[:\s]*([0-5])", refined_output)
-                if judgement_match:
-                    model_judgement_value = int(judgement_match.group(1))
+                    # Step 3: Refine the content using evaluator feedback.
+                    refinement_note = f"Refinement based on evaluator score: {score}"
+                    if has_structural_failure(findings):
+                        refinement_note = f"Refinement based on local pre-score: {score} (evaluator skipped)"
+                    refinement_started = time.perf_counter()
+                    refined_output = None
+                    refinement_completion_tokens = 0
+                    if candidate_fanout is not None:
+                        # Only the questions the evaluator flagged are re-scored before re-aggregating.
+                        # Overall or structural feedback re-runs the aggregation with that feedback.
+                        flagged_questions, overall_feedback = split_candidate_feedback(
+                            evaluator_feedback, len(candidate_fanout["results"]), has_structural_failure(findings)
+                        )
+                        refined_output = initial_output
+                        if flagged_questions or overall_feedback:
+                            refined_output, rescore_usage = rescore_candidate_questions(candidate_fanout, flagged_questions, overall_feedback)
+                            refinement_completion_tokens += rescore_usage[1]
+                        refinement_note += f"; questions re-scored: {', '.join(str(index + 1) for index in sorted(flagged_questions)) or 'none'}"
+                        refinement_note += f"; overall re-aggregated with feedback: {'yes' if overall_feedback else 'no'}"
+                        artifacts.put("candidate_fanout", json.dumps(candidate_fanout))
+                    elif parallel_sections:
+                        # Only the sections the evaluator flagged are rewritten, from the shared facts.
+                        refined_output, refined_headings, section_usage = refine_job_description_sections(initial_output, facts, evaluator_feedback)
+                        refinement_completion_tokens += section_usage[1]
+                        refinement_note += f"; sections refined: {', '.join(refined_headings) or 'none'}"
+                    elif patch_mode:
+                        # Apply the evaluator's changes as section-keyed edits when possible.
+                        refined_output, patch_usage = refine_with_patch(task, initial_output, evaluator_feedback)
+                        refinement_completion_tokens += patch_usage[1]
+                        refinement_note += "; patch applied" if refined_output is not None else "; patch rejected"
+                    if refined_output is None:
+                        refinement_instructions = (
+                            f"The following content was generated:\n{initial_output}\n\n"
+                            f"The evaluator provided the following feedback:\n{evaluator_feedback}\n\n"
+                            f"Please refine the content based on the feedback and ensure it follows this format:\n\n"
+                            f"{TASK_FORMAT_DEFINITIONS[task]}\n\n"
+                            "Important: Do not include any evaluation criteria, refinement notes, or improvement suggestions in the final output."
+                        )
+                        refined_output, regeneration_usage = run_completion(final_instructions, refinement_instructions)
+                        refinement_completion_tokens += regeneration_usage[1]
+                    print(f"[timing] task={task} parallel={parallel_sections or candidate_fanout is not None} refinement={time.perf_counter() - refinement_started:.1f}s")  # Log to console
+                    # A full regeneration costs about as many completion tokens as the initial draft.
+                    refinement_tokens_saved = completion_tokens - refinement_completion_tokens if completion_tokens != "" else None
+                    print(f"[tokens] task={task} refinement_completion={refinement_completion_tokens} saved={refinement_tokens_saved}")  # Log to console
                 
-                if model_judgement_value is not None and model_judgement_value <= 2:
-                    st.warning(
-                        "It looks like you may be trying to complete a task that this tool hasn't yet been fine-tuned to handle. "
-                        "At NexaTalent, we are committed to delivering tools that meet or exceed our rigorous quality standards. "
-                        "This commitment drives our mission to improve the quality of organizations through technology and data-driven insights.\n\n"
-                        "If you have questions about how our app works or the types of tasks it specializes in, please feel free to reach out to us at info@nexatalent.com."
+                    # Move the logging here, after all data is available
+                    log_to_google_sheets(
+                        tool_selection=task,
+                        user_input=user_notes,
+                        initial_output=initial_output,
+                        evaluator_feedback=evaluator_feedback,
+                        evaluator_score=score,
+                        refined_output=refined_output,
+                        feedback=refinement_note,
+                        prompt_tokens=prompt_tokens,
+                        completion_tokens=completion_tokens,
+                        total_tokens=total_tokens,
+                        user_summary=user_summary,
+                        model_comparison=model_comparison,
+                        model_judgement=model_judgement,
+                        refinement_tokens_saved=refinement_tokens_saved,
+                        prescore_findings=findings
                     )
-                else:
-                    # Clean the output by removing everything before the first "**"
-                    if "**" in refined_output:
-                        clean_output = refined_output.split("**", 1)[1]
-                        clean_output = "**" + clean_output
+                    report_session_memory(artifacts, stage="generate")
+
+                    # Step 4: Check the refined output for model judgement value.
+                    model_judgement_value = None
+                    judgement_match = re.search(r"\{model_judgement\}[:\s]*([0-5])", refined_output)
+                    if judgement_match:
+                        model_judgement_value = int(judgement_match.group(1))
+                
+                    if model_judgement_value is not None and model_judgement_value <= 2:
+                        st.warning(CONFIDENTIALITY_MESSAGE)
                     else:
-                        clean_output = refined_output
-                    
-                    # Display the cleaned output
-                    st.text_area("Generated Content", value=clean_output.strip(), height=400)
+                        # Display the cleaned output
+                        st.text_area("Generated Content", value=clean_generated_output(refined_output), height=400)
 
             except Exception as e:
                 st.error(f"An error occurred: {e}")
+                report_session_memory(artifacts, stage="error")
+
+# Questions from a fan-out candidate evaluation can be re-scored one at a time.
+fanout_state = artifacts.get("candidate_fanout") if task == "Evaluate candidate responses" else None
+if fanout_state:
+    candidate_fanout = json.loads(fanout_state)
+    question_labels = [f"Question {number}: {result['question']}" for number, result in enumerate(candidate_fanout["results"], start=1)]
+    with st.expander("Re-score a single question"):
+        question_label = st.selectbox("Question to re-score:", question_labels)
+        rescore_notes = st.text_input("Anything the re-score should pay attention to? (optional)")
+        if st.button("Re-score question"):
+            question_index = question_labels.index(question_label)
+            with st.spinner(f"Re-scoring question {question_index + 1}..."):
+                try:
+                    rescored_output, rescore_usage = rescore_candidate_questions(candidate_fanout, {question_index: rescore_notes.strip()})
+                    artifacts.put("candidate_fanout", json.dumps(candidate_fanout))
+                    print(f"[tokens] task={task} rescore_question={question_index + 1} completion={rescore_usage[1]}")  # Log to console
+                    st.text_area("Re-scored Evaluation", value=clean_generated_output(rescored_output), height=400)
+                except Exception as e:
+                    st.error(f"An error occurred: {e}")
+                report_session_memory(artifacts, stage="rescore")
 # Comment out or remove this function since we're not using Gemini currently
 # def verify_model_availability():
 #     """Verify that the required model is available"""